@@ -46,17 +46,40 @@ Parameters are:
 
 """
 
-import os, sys, shutil, re, yaml
+import os, sys, shutil, re, argparse, yaml
+
+# Use the libyaml based loader if PyYAML was built with it.
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
 
 usage = ("Usage: " + os.path.basename(sys.argv[0]) +
          " -i markup_file -t html_template ... [-o output_file]\n" +
          "Type --help for more details."
         )
 
+_SLIDE_DELIMITER_RE = re.compile(r'^\-{3}\r?\n', re.MULTILINE)
+"""Delimiter that separates the slides and the yaml properties in the
+markdown file."""
+
+_EXTERNAL_FILE_RE = re.compile(r'\[[^\]\n]*\]\(([^ \)\n]*)(\)| )')
+"""Reference to an external file such as ![alt](file "tooltip")."""
+
+_PLACEHOLDER_RE = re.compile(r'\{\{__([^{}]+?)__\}\}')
+"""A {{__key__}} placeholder, the key is captured in the first group."""
+
 def dieNice(errMsg = ""):
     print("Error: {0}\n{1}".format(errMsg, usage))
     sys.exit(1)
 
+def _fastCopy(src: str, dst: str):
+    """Copy the content of a file. shutil.copyfile uses os.sendfile on Linux
+    and fcopyfile on macOS, so the data is not copied through user space.
+    Unlike shutil.copy the permission bits are not copied, which saves a
+    chmod call per file."""
+    shutil.copyfile(src, dst)
+
 
 class MdParser:
 
@@ -92,7 +115,7 @@ class MdParser:
         """The final HTML of the page, that is either written to stdout
         or into the output file"""
         
-        self._slideDelimiter = re.compile('^\-{3}\r?\n$')
+        self._slideDelimiter = _SLIDE_DELIMITER_RE
         """The delimiter to separate the slides and the yaml properties
         in the markdown file."""
         
@@ -100,7 +123,17 @@ class MdParser:
         """Store here the processed files, key is the origial file,
         value is the new file."""
         
-        self._currentFileParsed = None
+        self._pendingCopies = []
+        """Source and target of the external files that still need to be
+        copied to the target directory."""
+        
+        self._basesrc = ''
+        """Directory of the file that is currently parsed, including a
+        trailing separator unless it's empty."""
+        
+        self._basetrg = ''
+        """Directory of the output file, including a trailing separator
+        unless it's empty."""
 
 
     def addFile(self, file: str):
@@ -167,14 +200,41 @@ class MdParser:
         if len(self.files) == 0:
             dieNice('No input file provided.')
 
+        self._basetrg = os.path.dirname(self.outFile)
+        if self._basetrg != '':
+            self._basetrg += os.sep
+
         for fname in self.files:
             try:
                 fp = open(fname, "r")
             except:
                 dieNice('Could not open file {0}.'.format(fname))
-            self._currentFileParsed = fname
+            self._basesrc = os.path.dirname(fname)
+            if self._basesrc != '':
+                self._basesrc += os.sep
             self.parseFile(fp)
             fp.close()
+        self._flushExternalFiles()
+        return self
+
+    def _flushExternalFiles(self):
+        """Copy all external files that were found while parsing the markup
+        files. The copies are I/O bound, so they are done in parallel.
+
+        Returns:
+        self:
+
+        """
+
+        if not self._pendingCopies:
+            return self
+
+        # Imported here, so that runs without any files to copy don't pay for it.
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            # Consume the results so that any error is raised here.
+            list(executor.map(lambda pair: _fastCopy(*pair), self._pendingCopies))
+        self._pendingCopies = []
         return self
 
     def parseFile(self, fp: int):
@@ -188,71 +248,74 @@ class MdParser:
     
         """
 
-        cnt = 0
-        item = ''
-        while line := fp.readline():
-            if self._slideDelimiter.match(line):
-                if cnt == 1:
-                    try:
-                        self.properties = yaml.safe_load(item)
-                        # test whether we have keys
-                        self.properties.keys()
-                    except:
-                        self.properties = {}
-                        self._slides.append(item)
-                    
-                elif cnt > 1:
+        parts = self._slideDelimiter.split(fp.read())
+        last = len(parts) - 1
+        for cnt, item in enumerate(parts):
+            # Anything before the first delimiter is skipped.
+            if cnt == 0 and last > 0:
+                continue
+            item = self.checkForExternalFile(item)
+            if cnt == last:
+                if item.strip():
+                    self._slides.append(item)
+            elif cnt == 1:
+                try:
+                    self.properties = yaml.load(item, Loader=_SafeLoader)
+                    # test whether we have keys
+                    self.properties.keys()
+                except:
+                    self.properties = {}
                     self._slides.append(item)
-                cnt += 1
-                item = ''
             else:
-                item += self.checkForExternalFile(line)
-
-        if len(item.replace("\r", '').replace('\n', '').strip()) > 0:
-            self._slides.append(item)
+                self._slides.append(item)
 
         return self
 
-    def checkForExternalFile(self, line: str)-> str:
+    def checkForExternalFile(self, text: str)-> str:
         """Check for file patterns like:
         ![placeholder](external_file "placeholder tooltip")
-        If something is found, check if the file exists, copy
-        it to the current output dir and change the name and
-        reference in the original markup."""
+        If something is found, check if the file exists, register
+        it to be copied to the current output dir and change the name
+        and reference in the original markup."""
         
         # If we do not want to copy external files, just quit here.
         if self.skipExtFiles == True:
-            return line
+            return text
         
         # Check for occurrences of references to external files.
-        for m in re.finditer('\[[^\]]*\]\(([^ \)]*)(\)| )', line):
-            if m.group(1) in self._externalFiles.keys():
-                line = line.replace(m.group(1), self._externalFiles[m.group(1)])
-                continue
-            
-            basesrc = os.path.dirname(self._currentFileParsed)
-            if basesrc != '':
-                basesrc += os.sep
+        return _EXTERNAL_FILE_RE.sub(self._replaceExternalFile, text)
+
+    def _replaceExternalFile(self, m: re.Match)-> str:
+        """Rewrite a single reference to an external file, that was matched
+        by _EXTERNAL_FILE_RE. Only the file name inside the link is changed.
+
+        Parameters:
+        m (re.Match): the matched reference, the file is in the first group.
+
+        Returns:
+        string: the reference with the new file name.
+        """
+
+        ref = m.group(1)
+        trg = self._externalFiles.get(ref)
+        if trg is None:
             # Check if the referenced file exists in relation to the markdown file where used.
-            if not os.path.isfile(basesrc + m.group(1)):
-                continue
+            if not os.path.isfile(self._basesrc + ref):
+                return m.group(0)
             # Create the basename for the target file that is also used in the HTML.
             trg = ''.join([
-                os.path.splitext(os.path.basename(m.group(1)))[0],
+                os.path.splitext(os.path.basename(ref))[0],
                 '_',
                 str(len(self._externalFiles) + 1),
-                os.path.splitext(os.path.basename(m.group(1)))[1],
+                os.path.splitext(os.path.basename(ref))[1],
             ])
-            self._externalFiles[m.group(1)] = trg
-            # Copy source file to destination...
-            basetrg = os.path.dirname(self.outFile)
-            if basetrg != '':
-                basetrg += os.sep
-            shutil.copy(basesrc + m.group(1), basetrg + trg)
-            # ... and replace the entry in the markup.
-            replacement = m.group(0).replace(m.group(1), trg)
-            line = line.replace(m.group(0), replacement)
-        return line
+            self._externalFiles[ref] = trg
+            # Remember to copy the source file to the destination.
+            self._pendingCopies.append((self._basesrc + ref, self._basetrg + trg))
+        # Replace the file name within the matched reference only.
+        start = m.start(1) - m.start(0)
+        end = m.end(1) - m.start(0)
+        return m.group(0)[:start] + trg + m.group(0)[end:]
 
 
     def replacePlaceholder(self, properties: dict, text: str)-> str:
@@ -267,13 +330,9 @@ class MdParser:
         string: text with the subsituted replacements.
         """
     
-        # Replace all property keys in the text.
-        for key in properties:
-            text = text.replace('{{__' + key + '__}}', str(properties[key]))
-        # Replace all placeholders that didn't have a property set.
-        text = re.sub(r'\{\{__\w+__\}\}', '', text)
-        
-        return text
+        # Replace all placeholders in a single pass, the ones that don't
+        # have a property set are replaced by an empty string.
+        return _PLACEHOLDER_RE.sub(lambda m: str(properties.get(m.group(1), '')), text)
 
     def getSlidesHtml(self)-> str:
         """Get the html content that is placed within the main part
@@ -285,12 +344,11 @@ class MdParser:
         Returns:
         string: The html for the slides.
         """
-        try:
-            slides = list(map(lambda slide: self.replacePlaceholder(self.properties['template'], slide), self._slides))
-        except KeyError:
-            slides = list(map(lambda slide: self.replacePlaceholder({}, slide), self._slides))
+        tpl = self.properties.get('template', {})
         delimiters = ['<section data-markdown>\n<textarea data-template>\n', '</textarea>\n</section>\n']
-        return delimiters[0] + (delimiters[1] + delimiters[0]).join(slides) + delimiters[1]
+        return delimiters[0] + (delimiters[1] + delimiters[0]).join(
+            self.replacePlaceholder(tpl, slide) for slide in self._slides
+        ) + delimiters[1]
 
     def applyTemplate(self, template: str):
         """Apply the parsed data into a template file. The templace
@@ -310,20 +368,14 @@ class MdParser:
         except:
             dieNice('Could not open template file "%s".' % template)
         
-        self._html = fp.read()
+        html = fp.read()
         fp.close()
 
-        # Replace the slides placeholder with something else to prevend the elimination.
-        self._html = self._html.replace('{{__slides__}}', '!###__slides__###!')
-
-        # Replace the theme name from the default or what was provided via cli argument.
-        self._html = self._html.replace('{{__theme__}}', self.theme)
-
-        # Replace all injected properties from the yaml header in the markup file(s).
-        self._html = self.replacePlaceholder(self.properties, self._html)
-        
-        # Now replace the slides placeholder with the real slides.
-        self._html = self._html.replace('!###__slides__###!', self.getSlidesHtml())
+        # Replace all injected properties from the yaml header in the markup file(s)
+        # together with the slides and the theme name in a single pass. The latter
+        # two cannot be overwritten by the yaml header.
+        merged = {**self.properties, 'slides': self.getSlidesHtml(), 'theme': self.theme}
+        self._html = self.replacePlaceholder(merged, html)
         
         return self
         
@@ -361,47 +413,36 @@ def main():
     with the md files to be processed and build the tempate string
     for the html file."""
 
-    # List of available options that can be changed via the command line.
-    options = ['c', 'e', 'i', 'o', 't']
+    # Available options that can be changed via the command line. The help is
+    # handled separately to print the documentation of this script.
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.error = dieNice
+    parser.add_argument('-h', '--help', action='store_true')
+    parser.add_argument('-c', dest='theme', default='black')
+    parser.add_argument('-e', dest='skipExtFiles', action='store_true')
+    parser.add_argument('-i', dest='files', action='append', default=[])
+    parser.add_argument('-o', '--o', dest='outputFile', default='')
+    parser.add_argument('-t', '--t', dest='templateFile', default='')
+    args = parser.parse_args()
+
+    if args.help:
+        print(__doc__)
+        sys.exit(0)
 
-    # the output file where the result is written to, ready for use in reveal.js.
-    outputFile = ''
-    
     # the tempate file with the html.
-    templateFile = ''
+    templateFile = args.templateFile
 
     # the worklog object that does the handling of the wiki articles.
-    worklog = MdParser()
-
-    # try to fetch the command line args
-    currentCmd = ''
-    for i in range(len(sys.argv)):
-        if i == 0:
-            continue
-        arg = sys.argv[i]
-        if arg == '--help' or arg == '-h':
-            print(__doc__)
-            sys.exit(0)
-        if arg[0:1] == '-':
-            currentCmd = arg[1:]
-            if not(currentCmd in options):
-                dieNice("Invalid argument %s." % currentCmd)
-            if currentCmd == 'e':
-                worklog.setDisableExternalFiles()
-                currentCmd = ''
-        elif len(currentCmd) > 0:
-            if currentCmd == 'c':
-                worklog.setTheme(arg)
-            elif currentCmd == 'i':
-                worklog.addFile(arg)
-            elif currentCmd == 'o':
-                try:
-                    worklog.setOutputFile(arg)
-                except Exception as ex:
-                    dieNice(ex) 
-            elif currentCmd == 't':
-                templateFile = arg
-            currentCmd = ''
+    worklog = MdParser().setTheme(args.theme)
+    if args.skipExtFiles:
+        worklog.setDisableExternalFiles()
+    for fname in args.files:
+        worklog.addFile(fname)
+    if len(args.outputFile) > 0:
+        try:
+            worklog.setOutputFile(args.outputFile)
+        except Exception as ex:
+            dieNice(ex)
 
     # Check if template file exists.
     if len(templateFile) == 0 or not os.path.isfile(templateFile):